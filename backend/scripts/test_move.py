@@ -1,36 +1,70 @@
+import argparse
+import asyncio
 import os
 import sys
+import time
 
 # Add the parent directory (backend) to sys.path so we can import src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi.testclient import TestClient
+import httpx
 from src.main import app
 
-client = TestClient(app)
+FENS = [
+    # Initial position
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    # 1. e4
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+    # 1. e4 e5 2. Nf3 Nc6 3. Bb5
+    "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    # 1. d4 d5 2. c4
+    "rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2",
+]
 
 
-def test_get_move_llm():
-    # Initial position FEN
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+async def test_get_move_llm(concurrency: int, model: str):
+    api_key = os.getenv("OPENAI_API_KEY")
+    print(f"\nScanning for API Key: {'Found' if api_key else 'Not Found'}")
+    print(f"Testing move generation for {len(FENS)} FENs (concurrency={concurrency})")
 
-    print(
-        f"\nScanning for API Key: {'Found' if os.getenv('OPENAI_API_KEY') else 'Not Found'}"
-    )
-    print(f"Testing move generation for FEN: {fen}")
+    headers = {"X-OpenAI-Key": api_key} if api_key else {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post_move(client: httpx.AsyncClient, fen: str) -> httpx.Response:
+        async with semaphore:
+            return await client.post(
+                "/move", json={"fen": fen, "model": model}, headers=headers
+            )
 
-    response = client.post("/move", json={"fen": fen})
+    start_time = time.perf_counter()
+    # Run the app's lifespan so shared clients are closed on exit
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            responses = await asyncio.gather(*(post_move(client, f) for f in FENS))
+    elapsed = time.perf_counter() - start_time
 
-    if response.status_code == 200:
-        data = response.json()
-        print("\n✅ Success!")
-        print(f"Move: {data['move']}")
-        print(f"SAN: {data['san']}")
-    else:
-        print("\n❌ Failed!")
-        print(f"Status Code: {response.status_code}")
-        print(f"Detail: {response.json()}")
+    for fen, response in zip(FENS, responses):
+        print(f"\nFEN: {fen}")
+        if response.status_code == 200:
+            data = response.json()
+            print("✅ Success!")
+            print(f"Move: {data['move']}")
+            print(f"SAN: {data['san']}")
+        else:
+            print("❌ Failed!")
+            print(f"Status Code: {response.status_code}")
+            print(f"Detail: {response.json()}")
+
+    print(f"\nCompleted {len(FENS)} requests in {elapsed:.2f}s")
 
 
 if __name__ == "__main__":
-    test_get_move_llm()
+    parser = argparse.ArgumentParser(description="Request moves from the LLM backend")
+    _ = parser.add_argument(
+        "--concurrency", type=int, default=4, help="Maximum in-flight requests"
+    )
+    _ = parser.add_argument("--model", default="gpt-4o-mini", help="OpenAI model")
+    args = parser.parse_args()
+    asyncio.run(test_get_move_llm(args.concurrency, args.model))
@@ -1,13 +1,28 @@
+import asyncio
 import logging
+import re
+import time
+from collections.abc import AsyncIterator
 from enum import Enum
+from functools import lru_cache
 from typing import Annotated
 
 import chess
+import orjson
+from cachetools import LRUCache
 from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from openai import APIConnectionError, AsyncOpenAI, AuthenticationError, RateLimitError
-from pydantic import BaseModel
-from src.core.config import get_langchain_client
-from src.models.schemas import MoveRequest, MoveResponse
+from pydantic import BaseModel, create_model
+from src.core.batcher import move_batcher
+from src.core.config import (
+    LLM_TEMPERATURE,
+    USE_LANGCHAIN,
+    get_openai_client,
+    get_structured_llm,
+)
+from src.core.prompts import Messages, move_messages
+from src.models.schemas import MoveRequest, MoveResponse, MoveSelectionBase
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -25,11 +40,10 @@ async def set_api_key(x_openai_key: Annotated[str | None, Header()] = None):
     if not x_openai_key:
         raise HTTPException(status_code=400, detail="Missing X-OpenAI-Key header")
 
-    # Create temporary client to validate the key
-    temp_client = AsyncOpenAI(api_key=x_openai_key)
+    client = get_openai_client(api_key=x_openai_key)
     try:
         # Minimal call to validate the key
-        _ = await temp_client.models.list()
+        _ = await client.models.list()
     except AuthenticationError:
         raise HTTPException(status_code=401, detail="Invalid OpenAI API key provided.")
     except Exception as e:
@@ -39,111 +53,288 @@ async def set_api_key(x_openai_key: Annotated[str | None, Header()] = None):
     return {"status": "success", "message": "API key validated"}
 
 
+# Models that are likely chat models (GPT-3.5, GPT-4, o1, etc.)
+_CHAT_MODEL_RE = re.compile(r"^(?:gpt-|o1-)(?!.*(?:-vision|-instruct|realtime|audio))")
+
+# Model lists rarely change, so they are cached per API key. Expired entries are
+# kept as a fallback for failed refreshes; both caches evict the least recent key
+MODELS_CACHE_TTL = 600.0
+MODELS_CACHE_MAX_KEYS = 1024
+_models_cache: LRUCache[str, tuple[float, list[str]]] = LRUCache(
+    maxsize=MODELS_CACHE_MAX_KEYS
+)
+_models_locks: LRUCache[str, asyncio.Lock] = LRUCache(maxsize=MODELS_CACHE_MAX_KEYS)
+
+
+def _cached_models(api_key: str) -> list[str] | None:
+    cached = _models_cache.get(api_key)
+    if cached and time.monotonic() - cached[0] < MODELS_CACHE_TTL:
+        return cached[1]
+    return None
+
+
+def _models_lock(api_key: str) -> asyncio.Lock:
+    if (lock := _models_locks.get(api_key)) is None:
+        lock = _models_locks[api_key] = asyncio.Lock()
+    return lock
+
+
 @router.get("/config/models")
 async def get_models(x_openai_key: Annotated[str | None, Header()] = None):
     if not x_openai_key:
         return []
 
-    client = AsyncOpenAI(api_key=x_openai_key)
-    try:
-        models = await client.models.list()
-        # Filter for models that are likely chat models (GPT-3.5, GPT-4, o1, etc.)
-        chat_models = [
-            m.id
-            for m in models.data
-            if m.id.startswith(("gpt-", "o1-"))
-            and not any(
-                x in m.id for x in ["-vision", "-instruct", "realtime", "audio"]
+    if (chat_models := _cached_models(x_openai_key)) is not None:
+        return chat_models
+
+    # Concurrent requests for the same key wait for a single upstream call
+    async with _models_lock(x_openai_key):
+        if (chat_models := _cached_models(x_openai_key)) is not None:
+            return chat_models
+
+        client = get_openai_client(api_key=x_openai_key)
+        try:
+            models = await client.models.list()
+            chat_models = sorted(
+                m.id for m in models.data if _CHAT_MODEL_RE.match(m.id)
             )
-        ]
-        logger.info(f"Found {len(chat_models)} chat models")
-        return sorted(chat_models)
-    except Exception as e:
-        logger.error(f"Error fetching models: {e}")
-        return ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"]  # Fallback
+            logger.info(f"Found {len(chat_models)} chat models")
+            _models_cache[x_openai_key] = (time.monotonic(), chat_models)
+            return chat_models
+        except Exception as e:
+            logger.error(f"Error fetching models: {e}")
+            if stale := _models_cache.get(x_openai_key):
+                return stale[1]
+            return ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"]  # Fallback
 
 
-@router.post("/move", response_model=MoveResponse)
-async def get_move(
-    request: MoveRequest, x_openai_key: Annotated[str | None, Header()] = None
-):
+@lru_cache(maxsize=64)
+def _parse_fen(fen: str) -> chess.Board:
+    """Parse each FEN once; callers get a copy since boards are mutable."""
+    return chess.Board(fen)
+
+
+def _validate_position(fen: str) -> tuple[chess.Board, dict[str, chess.Move]]:
+    """Parse the FEN and index its legal moves by UCI string in a single generation pass."""
     try:
-        board = chess.Board(request.fen)
+        board = _parse_fen(fen).copy(stack=False)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid FEN string")
 
-    if board.is_game_over():
+    legal_moves = {m.uci(): m for m in board.generate_legal_moves()}
+    # Checkmate and stalemate leave no legal moves; the remaining game-over
+    # rules are checked directly instead of regenerating moves via is_game_over()
+    if (
+        not legal_moves
+        or board.is_insufficient_material()
+        or board.is_seventyfive_moves()
+        or board.is_fivefold_repetition()
+    ):
         raise HTTPException(status_code=400, detail="Game is over")
 
-    legal_moves = list(board.legal_moves)
-    if not legal_moves:
-        raise HTTPException(status_code=400, detail="No legal moves available")
+    return board, legal_moves
 
+
+@lru_cache(maxsize=4096)
+def _move_selection_model(moves: frozenset[str]) -> type[MoveSelectionBase]:
+    """Build the structured output model once per legal-move set; positions repeat often."""
     # Create a dynamic Enum for legal moves
-    move_map = {m.uci(): m.uci() for m in legal_moves}
-    MoveEnum = Enum("MoveEnum", move_map, type=str)
-    logger.info(f"MoveEnum count for current request: {len(MoveEnum)}")
+    MoveEnum = Enum("MoveEnum", {m: m for m in sorted(moves)}, type=str)
+    logger.info(f"MoveEnum count for new legal-move set: {len(moves)}")
 
     # Define the response structure using the dynamic Enum
-    class MoveSelection(BaseModel):
-        reasoning: str
-        move: MoveEnum
+    MoveSelection = create_model(
+        "MoveSelection", __base__=MoveSelectionBase, move=(MoveEnum, ...)
+    )
+    return MoveSelection
+
 
+def _require_api_key(x_openai_key: str | None) -> str:
     if not x_openai_key:
         raise HTTPException(
             status_code=412,
             detail="OpenAI API key is missing. Please configure it in the settings.",
         )
+    return x_openai_key
 
-    llm = get_langchain_client(api_key=x_openai_key, model=request.model)
-    logger.info(f"Making move for FEN: {request.fen} using model: {request.model}")
-    structured_llm = llm.with_structured_output(MoveSelection)
 
-    try:
-        selected_move_data = await structured_llm.ainvoke(
-            [
-                (
-                    "system",
-                    "You are a grandmaster chess player. Analyze the given FEN and select the best move from the available legal moves. Provide your reasoning and the chosen move.",
-                ),
-                ("user", f"FEN: {request.fen}"),
-            ]
-        )
+def _forced_move(
+    board: chess.Board, legal_moves: dict[str, chess.Move]
+) -> dict[str, str] | None:
+    """Return the only legal move, if there is just one, so the LLM can be skipped."""
+    if len(legal_moves) != 1:
+        return None
+    ((move_uci, move),) = legal_moves.items()
+    logger.debug(f"Only one legal move ({move_uci}), skipping the LLM")
+    return {"move": move_uci, "san": board.san(move)}
 
-        if not selected_move_data:
-            raise HTTPException(status_code=500, detail="Failed to parse LLM response")
 
-        # Handle both dict and Pydantic model (LangChain can return either depending on config)
-        if isinstance(selected_move_data, dict):
-            move_uci = selected_move_data["move"]
-        else:
-            move_uci = selected_move_data.move
-            if hasattr(move_uci, "value"):
-                move_uci = move_uci.value
-        move = chess.Move.from_uci(move_uci)
-        logger.info(f"Model move: {move_uci}")
-        san = board.san(move)
+def _lookup_move(legal_moves: dict[str, chess.Move], move_uci: str) -> chess.Move:
+    move = legal_moves.get(move_uci)
+    if move is None:
+        logger.error(f"LLM produced illegal move: {move_uci}")
+        raise HTTPException(status_code=500, detail="LLM produced illegal move")
+    return move
 
-        return MoveResponse(move=move_uci, san=san)
 
-    except RateLimitError as e:
+def _to_http_exception(e: Exception) -> HTTPException:
+    """Map errors raised while talking to OpenAI to the HTTP error sent to the client."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, RateLimitError):
         logger.error(f"OpenAI Rate Limit Exceeded: {e}")
-        raise HTTPException(
+        return HTTPException(
             status_code=429,
             detail="OpenAI API quota exceeded or rate limit reached. Please check your plan limits.",
         )
-    except AuthenticationError as e:
+    if isinstance(e, AuthenticationError):
         logger.error(f"OpenAI Authentication Failed: {e}")
-        raise HTTPException(
+        return HTTPException(
             status_code=401,
             detail="OpenAI API key is invalid or expired. Please check your settings.",
         )
-    except APIConnectionError as e:
+    if isinstance(e, APIConnectionError):
         logger.error(f"OpenAI Connection Error: {e}")
-        raise HTTPException(
+        return HTTPException(
             status_code=503,
             detail="Failed to connect to OpenAI API. Please check your internet connection.",
         )
+    logger.error(f"Unexpected error while generating move: {e}")
+    return HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+# Openings, puzzles and test suites repeat positions, so recent moves are reused.
+# Entries are per API key, so a cached move is only returned to the key that paid
+# for it and an invalid key still gets its 401 from OpenAI
+_move_cache: LRUCache[tuple[str, str, str], dict[str, str]] = LRUCache(maxsize=10_000)
+
+
+@router.post("/config/cache/clear")
+def clear_move_cache():
+    _move_cache.clear()
+    return {"status": "success", "message": "Move cache cleared"}
+
+
+@router.post("/move", response_model=MoveResponse)
+async def get_move(
+    request: MoveRequest, x_openai_key: Annotated[str | None, Header()] = None
+):
+    # Logged here rather than in middleware so the body is only parsed once
+    logger.info(f"Incoming move request for FEN: {request.fen}")
+    board, legal_moves = _validate_position(request.fen)
+    api_key = _require_api_key(x_openai_key)
+
+    if forced := _forced_move(board, legal_moves):
+        return forced
+
+    cache_key = (api_key, board.fen(), request.model)
+    if request.use_cache and (cached := _move_cache.get(cache_key)) is not None:
+        logger.info(f"Serving cached move for FEN: {request.fen}")
+        return cached
+
+    logger.info(f"Making move for FEN: {request.fen} using model: {request.model}")
+
+    if USE_LANGCHAIN:
+
+        async def invoke(schema: type[BaseModel], messages: Messages):
+            structured_llm = get_structured_llm(api_key, request.model, schema)
+            # LangChain accepts OpenAI-style message dicts as-is
+            return await structured_llm.ainvoke(messages)  # pyright: ignore[reportArgumentType]
+
+    else:
+        client = get_openai_client(api_key=api_key)
+
+        async def invoke(schema: type[BaseModel], messages: Messages):
+            completion = await client.chat.completions.parse(
+                model=request.model,
+                messages=messages,
+                response_format=schema,
+                temperature=LLM_TEMPERATURE,
+            )
+            return completion.choices[0].message.parsed
+
+    try:
+        moves = frozenset(legal_moves)
+        selected_move_data = await move_batcher.submit(
+            (api_key, request.model),
+            request.fen,
+            moves,
+            _move_selection_model(moves),
+            invoke,
+        )
+
+        if not selected_move_data:
+            raise HTTPException(status_code=500, detail="Failed to parse LLM response")
+
+        move_uci = selected_move_data.move.value
+        logger.info(f"Model move: {move_uci}")
+        san = board.san(_lookup_move(legal_moves, move_uci))
+
+        # response_model still validates and documents this, so skip building it twice
+        result = {"move": move_uci, "san": san}
+        _move_cache[cache_key] = result
+        return result
+
     except Exception as e:
-        logger.error(f"Unexpected error in get_move: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+        raise _to_http_exception(e)
+
+
+def _sse_event(payload: dict[str, object]) -> str:
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+async def _stream_move_events(
+    client: AsyncOpenAI,
+    request: MoveRequest,
+    board: chess.Board,
+    legal_moves: dict[str, chess.Move],
+    MoveSelection: type[MoveSelectionBase],
+) -> AsyncIterator[str]:
+    """Yield reasoning tokens as they arrive, then a final event with the validated move."""
+    if forced := _forced_move(board, legal_moves):
+        yield _sse_event({"done": True, **forced})
+        return
+
+    try:
+        async with client.chat.completions.stream(
+            model=request.model,
+            messages=move_messages(request.fen, frozenset(legal_moves)),
+            response_format=MoveSelection,
+            temperature=LLM_TEMPERATURE,
+        ) as stream:
+            async for event in stream:
+                if event.type == "content.delta":
+                    yield _sse_event({"token": event.delta})
+            completion = await stream.get_final_completion()
+
+        selected_move_data = completion.choices[0].message.parsed
+        if not selected_move_data:
+            raise HTTPException(status_code=500, detail="Failed to parse LLM response")
+
+        move_uci = MoveSelection.model_validate(selected_move_data).move.value
+        logger.info(f"Model move: {move_uci}")
+        san = board.san(_lookup_move(legal_moves, move_uci))
+
+        yield _sse_event({"done": True, "move": move_uci, "san": san})
+
+    except Exception as e:
+        # Headers are already sent, so errors are reported as a final event.
+        error = _to_http_exception(e)
+        yield _sse_event({"error": error.detail, "status": error.status_code})
+
+
+@router.post("/move/stream")
+async def stream_move(
+    request: MoveRequest, x_openai_key: Annotated[str | None, Header()] = None
+):
+    board, legal_moves = _validate_position(request.fen)
+    api_key = _require_api_key(x_openai_key)
+    MoveSelection = _move_selection_model(frozenset(legal_moves))
+
+    client = get_openai_client(api_key=api_key)
+    logger.info(f"Streaming move for FEN: {request.fen} using model: {request.model}")
+    return StreamingResponse(
+        _stream_move_events(client, request, board, legal_moves, MoveSelection),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
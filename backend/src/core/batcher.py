@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from pydantic import BaseModel, create_model
+from src.core.prompts import Messages, batch_move_messages, move_messages
+
+logger = logging.getLogger(__name__)
+
+# Concurrent requests arriving within BATCH_WAIT_MS share a single LLM call
+BATCH_MAX = 8
+BATCH_WAIT_MS = 20
+
+Invoke = Callable[[type[BaseModel], Messages], Awaitable[Any]]
+
+
+@dataclass
+class _PendingMove:
+    key: Hashable
+    fen: str
+    moves: frozenset[str]
+    schema: type[BaseModel]
+    invoke: Invoke
+    future: asyncio.Future[Any]
+
+
+@lru_cache(maxsize=1024)
+def _batch_model(schemas: tuple[type[BaseModel], ...]) -> type[BaseModel]:
+    """Combine per-position schemas into one model with a field per position."""
+    fields: dict[str, Any] = {
+        f"p{i}": (schema, ...) for i, schema in enumerate(schemas)
+    }
+    return create_model("MoveBatch", **fields)
+
+
+@dataclass
+class _Worker:
+    queue: asyncio.Queue[_PendingMove]
+    task: asyncio.Task[None]
+    dispatches: set[asyncio.Task[None]]
+
+
+class MoveBatcher:
+    """Coalesce concurrent move requests sharing a key into one structured LLM call.
+
+    Requests are grouped by `key` (API key and model), since only those can share
+    a call. A request that arrives while the batcher is idle is dispatched at
+    once; only requests that queue up behind others wait up to `wait_ms`.
+    """
+
+    def __init__(self, max_size: int = BATCH_MAX, wait_ms: int = BATCH_WAIT_MS):
+        self.max_size = max_size
+        self.wait = wait_ms / 1000
+        # Queues, tasks and futures are tied to one event loop, so each serving
+        # loop (e.g. a TestClient portal next to an ASGI test client) gets its own
+        self._workers: dict[asyncio.AbstractEventLoop, _Worker] = {}
+
+    async def submit(
+        self,
+        key: Hashable,
+        fen: str,
+        moves: frozenset[str],
+        schema: type[BaseModel],
+        invoke: Invoke,
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        worker = self._workers.get(loop)
+        if worker is None or worker.task.done():
+            # Started lazily so the queue and worker live on the serving event loop
+            for closed in [lp for lp in self._workers if lp.is_closed()]:
+                del self._workers[closed]
+            queue: asyncio.Queue[_PendingMove] = asyncio.Queue()
+            dispatches: set[asyncio.Task[None]] = set()
+            task = asyncio.create_task(self._run(queue, dispatches))
+            worker = self._workers[loop] = _Worker(queue, task, dispatches)
+
+        future: asyncio.Future[Any] = loop.create_future()
+        worker.queue.put_nowait(_PendingMove(key, fen, moves, schema, invoke, future))
+        return await future
+
+    async def stop(self):
+        """Stop the worker serving the current event loop."""
+        worker = self._workers.pop(asyncio.get_running_loop(), None)
+        if worker is None:
+            return
+        _ = worker.task.cancel()
+        for task in list(worker.dispatches):
+            _ = task.cancel()
+        while not worker.queue.empty():
+            _ = worker.queue.get_nowait().future.cancel()
+
+    async def _run(
+        self, queue: asyncio.Queue[_PendingMove], dispatches: set[asyncio.Task[None]]
+    ):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            try:
+                # Only wait for company when the batcher is already busy
+                if not queue.empty() or dispatches:
+                    deadline = loop.time() + self.wait
+                    while len(batch) < self.max_size:
+                        try:
+                            timeout = deadline - loop.time()
+                            batch.append(await asyncio.wait_for(queue.get(), timeout))
+                        except TimeoutError:
+                            break
+            except asyncio.CancelledError:
+                # Requests already taken off the queue would otherwise wait forever
+                for item in batch:
+                    _ = item.future.cancel()
+                raise
+
+            groups: defaultdict[Hashable, list[_PendingMove]] = defaultdict(list)
+            for item in batch:
+                groups[item.key].append(item)
+            for group in groups.values():
+                task = asyncio.create_task(self._dispatch(group))
+                dispatches.add(task)
+                task.add_done_callback(dispatches.discard)
+
+    async def _dispatch(self, group: list[_PendingMove]):
+        try:
+            if len(group) == 1:
+                item = group[0]
+                messages = move_messages(item.fen, item.moves)
+                results = [await item.invoke(item.schema, messages)]
+            else:
+                logger.info(f"Batching {len(group)} move requests into one LLM call")
+                schema = _batch_model(tuple(item.schema for item in group))
+                messages = batch_move_messages(
+                    [(item.fen, item.moves) for item in group]
+                )
+                data = await group[0].invoke(schema, messages)
+                if data is None:
+                    # A refusal has no parsed output; callers report it as unparsed
+                    results = [None] * len(group)
+                else:
+                    results = [getattr(data, f"p{i}") for i in range(len(group))]
+        except asyncio.CancelledError:
+            for item in group:
+                _ = item.future.cancel()
+            raise
+        except Exception as e:
+            for item in group:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for item, result in zip(group, results):
+            if not item.future.done():
+                item.future.set_result(result)
+
+
+move_batcher = MoveBatcher()
@@ -1,13 +1,63 @@
+import os
+from functools import lru_cache
+
+import httpx
 from langchain_openai import ChatOpenAI
-from pydantic import SecretStr
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from pydantic import BaseModel, SecretStr
 from src.core.logging_config import setup_logging
 
 _ = setup_logging()
 
+LLM_TEMPERATURE = 0.2
+
+# Moves call the OpenAI API directly; LangChain is opt-in for callbacks/tracing
+USE_LANGCHAIN = os.getenv("USE_LANGCHAIN", "false").lower() in ("1", "true", "yes")
+
+# Shared keep-alive pool so requests reuse connections to the OpenAI API
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        # HTTP/2 lets concurrent requests multiplex over one connection
+        _http_client = DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+    return _http_client
+
 
+@lru_cache(maxsize=128)
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=api_key, http_client=get_http_client())
+
+
+@lru_cache(maxsize=128)
 def get_langchain_client(api_key: str, model: str = "gpt-4o-mini"):
     return ChatOpenAI(
         api_key=SecretStr(api_key),
         model=model,
-        temperature=0.2,
+        temperature=LLM_TEMPERATURE,
+        http_async_client=get_http_client(),
     )
+
+
+@lru_cache(maxsize=1024)
+def get_structured_llm(api_key: str, model: str, schema: type[BaseModel]):
+    # Schemas are cached per legal-move set, so their bindings can be reused too
+    llm = get_langchain_client(api_key=api_key, model=model)
+    return llm.with_structured_output(schema)
+
+
+async def close_http_client():
+    """Drop cached clients and close the shared connection pool."""
+    global _http_client
+    get_structured_llm.cache_clear()
+    get_openai_client.cache_clear()
+    get_langchain_client.cache_clear()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
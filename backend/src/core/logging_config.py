@@ -1,14 +1,36 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 
+_listener: logging.handlers.QueueListener | None = None
+
 
 def setup_logging():
-    """Configure structured logging for the application."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)],
-    )
+    """Configure structured logging for the application.
+
+    Log calls only enqueue the record; a background listener thread owns the
+    stdout handler so writes never block the event loop.
+    """
+    global _listener
+    root = logging.getLogger()
+    # Leave logging alone if the root logger was already configured elsewhere
+    if _listener is None and not root.handlers:
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(
+            logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+        )
+        _listener = logging.handlers.QueueListener(
+            log_queue, stream_handler, respect_handler_level=True
+        )
+        _listener.start()
+        _ = atexit.register(_listener.stop)
+
+        # Like basicConfig, but the stdout handler runs on the listener thread
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(logging.INFO)
 
     # Set specific log levels for some libraries if needed
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
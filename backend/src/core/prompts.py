@@ -0,0 +1,31 @@
+from openai.types.chat import ChatCompletionMessageParam
+
+# System prompts are kept short to cut input tokens; the per-position details
+# (FEN and legal moves) go in the user message
+SYSTEM_PROMPT = "You are a chess grandmaster. Pick the best move from the provided legal UCI moves and explain your reasoning."
+
+BATCH_SYSTEM_PROMPT = "You are a chess grandmaster. For each position labelled p0, p1, ... pick the best move from its provided legal UCI moves and explain your reasoning, in the field with the same label."
+
+Messages = list[ChatCompletionMessageParam]
+
+
+def _position_prompt(fen: str, moves: frozenset[str]) -> str:
+    return f"FEN: {fen}\nLegal UCI moves: {','.join(sorted(moves))}\nReply with one of these."
+
+
+def move_messages(fen: str, moves: frozenset[str]) -> Messages:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": _position_prompt(fen, moves)},
+    ]
+
+
+def batch_move_messages(positions: list[tuple[str, frozenset[str]]]) -> Messages:
+    content = "\n\n".join(
+        f"p{i}:\n{_position_prompt(fen, moves)}"
+        for i, (fen, moves) in enumerate(positions)
+    )
+    return [
+        {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
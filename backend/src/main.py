@@ -4,8 +4,11 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from src.api.endpoints import router as api_router
+from src.core.batcher import move_batcher
+from src.core.config import close_http_client
 from src.core.logging_config import setup_logging
 
 # Setup logging
@@ -17,9 +20,13 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Chess LLM Lab Backend...")
     yield
     logger.info("Shutting down Chess LLM Lab Backend...")
+    await move_batcher.stop()
+    await close_http_client()
 
 
-app = FastAPI(title="Chess LLM Lab", lifespan=lifespan)
+app = FastAPI(
+    title="Chess LLM Lab", lifespan=lifespan, default_response_class=ORJSONResponse
+)
 
 
 @app.middleware("http")
@@ -27,17 +34,6 @@ async def log_requests(
     request: Request, call_next: typing.Callable[[Request], typing.Awaitable[Response]]
 ):
     start_time = time.time()
-
-    # Log FEN if it's a move request
-    if request.url.path == "/move" and request.method == "POST":
-        try:
-            # We need to clone the body to read it and still have it available for the endpoint
-            body = await request.json()
-            fen = body.get("fen", "Unknown")
-            logger.info(f"Incoming move request for FEN: {fen}")
-        except Exception:
-            logger.warning("Could not parse FEN from request body for logging")
-
     response = await call_next(request)
 
     process_time = time.time() - start_time
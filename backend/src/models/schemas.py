@@ -1,3 +1,5 @@
+from enum import Enum
+
 from pydantic import BaseModel
 
 
@@ -8,8 +10,16 @@ class ApiKeyRequest(BaseModel):
 class MoveRequest(BaseModel):
     fen: str
     model: str = "gpt-4o-mini"
+    use_cache: bool = True
 
 
 class MoveResponse(BaseModel):
     move: str
     san: str | None = None
+
+
+class MoveSelectionBase(BaseModel):
+    """Structured LLM output, subclassed per position with an Enum of its legal moves."""
+
+    reasoning: str
+    move: Enum
@@ -1,10 +1,47 @@
+import asyncio
+
+import httpx
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
+from src.api import endpoints
+from src.core import config
 from src.main import app
 
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    pass
+else:
+    # TestClient's portal and asyncio.run() both pick their loop up from the policy
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def client():
     # Use TestClient for synchronous testing of async endpoints (FastAPI handles this magic)
+    # Built once per session; per-test state is reset by clear_endpoint_caches
     with TestClient(app) as c:
         yield c
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def aclient():
+    # Drives the app on the test's own loop, with no thread portal per request
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as c:
+            yield c
+
+
+@pytest.fixture(autouse=True)
+def clear_endpoint_caches():
+    # The app outlives each test, so reset its module-level state: cached LLM
+    # bindings, model lists and moves, plus the per-key locks, which bind to
+    # whichever loop (TestClient's or aclient's) first contends for them
+    yield
+    config.get_structured_llm.cache_clear()
+    endpoints._models_cache.clear()
+    endpoints._models_locks.clear()
+    endpoints._move_cache.clear()
@@ -1,314 +1,686 @@
-from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
+import time
+from types import SimpleNamespace
 
+import httpx
+import orjson
 import pytest
-
-# --- Health Check Tests ---
-
-
-def test_health_check(client):
-    """Test the health check endpoint returns 200 and correct status."""
-    response = client.get("/health")
-    assert response.status_code == 200
-    expected_keys = {"status", "openai_api_key_configured"}
-    assert expected_keys.issubset(response.json().keys())
-    assert response.json()["status"] == "ok"
-    # Without header, it should report not configured
-    assert response.json()["openai_api_key_configured"] is False
-
-
-def test_health_check_with_header(client):
-    """Test health check reports configured when header is present."""
-    response = client.get("/health", headers={"X-OpenAI-Key": "sk-test"})
-    assert response.json()["openai_api_key_configured"] is True
-
-
-# --- Config API Key Tests ---
-
-
-@patch("src.api.endpoints.AsyncOpenAI")
-def test_validate_api_key_success(mock_async_openai, client):
-    """Test validating a valid API key via header."""
-    mock_client_instance = AsyncMock()
-    mock_async_openai.return_value = mock_client_instance
-    mock_client_instance.models.list.return_value = {"data": []}
-
-    # Endpoint now expects key in header, payload can be empty or ignored
-    headers = {"X-OpenAI-Key": "sk-test-valid-key"}
-    response = client.post("/config/api-key", json={}, headers=headers)
-
-    assert response.status_code == 200
-    assert response.json()["status"] == "success"
-
-
-@patch("src.api.endpoints.AsyncOpenAI")
-def test_validate_api_key_invalid(mock_async_openai, client):
-    """Test validating an invalid API key."""
-    mock_client_instance = AsyncMock()
-    mock_async_openai.return_value = mock_client_instance
-    mock_client_instance.models.list.side_effect = Exception("Invalid key")
-
-    headers = {"X-OpenAI-Key": "sk-test-invalid-key"}
-    response = client.post("/config/api-key", json={}, headers=headers)
-
-    assert response.status_code == 401
-    assert "Invalid OpenAI API key" in response.json()["detail"]
-
-
-def test_validate_api_key_missing_header(client):
-    """Test validation fails if header is missing."""
-    response = client.post("/config/api-key", json={})
-    assert response.status_code == 400
-    assert "Missing X-OpenAI-Key header" in response.json()["detail"]
+from fastapi import HTTPException
+from openai import APIConnectionError, AuthenticationError, RateLimitError
+from src.api import endpoints
+from src.api.endpoints import (
+    _move_selection_model,
+    _validate_position,
+    get_models,
+    set_api_key,
+)
+from src.core import config
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FOOLS_MATE_FEN = "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"
+STALEMATE_FEN = "k7/8/1K6/8/8/8/8/8 b - - 0 1"
+BARE_KINGS_FEN = "k7/8/1K6/8/8/8/8/8 w - - 0 1"
+# Black's queen on b2 leaves the white king a single legal move: Kxb2
+FORCED_MOVE_FEN = "k7/8/8/8/8/8/1q6/K7 w - - 0 1"
+
+# Shared request bodies; never mutate them, build variants with {**payload, ...}
+START_PAYLOAD = {"fen": START_FEN}
+FORCED_MOVE_PAYLOAD = {"fen": FORCED_MOVE_FEN}
+
+# (fen, requested model, llm move, expected SAN); a model of None leaves the
+# request on the default. Tests that exercise request handling rather than the
+# position itself just post START_PAYLOAD
+MOVE_OK_CASES = [
+    (START_FEN, None, "e2e4", "e4"),
+    (
+        "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+        "gpt-4o",
+        "c7c5",
+        "c5",
+    ),
+    (
+        "r1bqkbnr/1ppp1ppp/p1n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 4",
+        None,
+        "e1g1",
+        "O-O",
+    ),
+    (
+        "rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2",
+        None,
+        "d5c4",
+        "dxc4",
+    ),
+    ("8/P6k/8/8/8/8/8/K7 w - - 0 1", None, "a7a8q", "a8=Q"),
+]
+
+# Built once: the handlers only match on the exception type
+_OPENAI_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+RATE_LIMIT_ERROR = RateLimitError(
+    message="Rate limit exceeded",
+    response=httpx.Response(429, request=_OPENAI_REQUEST),
+    body=None,
+)
+AUTH_ERROR = AuthenticationError(
+    message="Invalid key",
+    response=httpx.Response(401, request=_OPENAI_REQUEST),
+    body=None,
+)
+CONNECTION_ERROR = APIConnectionError(request=_OPENAI_REQUEST)
+
+# (error raised by OpenAI, expected status, expected detail substring)
+ERR_CASES = [
+    (RATE_LIMIT_ERROR, 429, "OpenAI API quota exceeded"),
+    (AUTH_ERROR, 401, "OpenAI API key is invalid"),
+    (CONNECTION_ERROR, 503, "Failed to connect to OpenAI API"),
+]
+
+
+# A models.list() page mixing chat models with ones /config/models filters out
+_MODELS_RESPONSE = SimpleNamespace(
+    data=[
+        SimpleNamespace(id=model_id)
+        for model_id in (
+            "gpt-4o",
+            "gpt-4o-mini",
+            "gpt-3.5-turbo",
+            "o1-preview",
+            "gpt-4-vision-preview",
+            "gpt-4-instruct",
+            "text-embedding-ada-002",
+            "dall-e-3",
+        )
+    ]
+)
 
 
-# --- Move Endpoint Tests ---
+def _json(response):
+    # The app responds through ORJSONResponse, so decode with orjson as well
+    return orjson.loads(response.content)
 
 
-@pytest.fixture
-def valid_headers():
-    return {"X-OpenAI-Key": "sk-test-key-for-moves"}
+class _MoveVal:
+    __slots__ = ("value",)
 
+    def __init__(self, value):
+        self.value = value
 
-def test_move_invalid_fen(client, valid_headers):
-    """Test requesting a move with an invalid FEN string."""
-    payload = {"fen": "invalid-fen-string"}
-    response = client.post("/move", json=payload, headers=valid_headers)
-    assert response.status_code == 400
-    assert response.json()["detail"] == "Invalid FEN string"
 
+class MoveSelectionMock:
+    """Stands in for the parsed structured output of a single position."""
 
-def test_move_game_over(client, valid_headers):
-    """Test requesting a move when the game is already over (Checkmate)."""
-    fools_mate_fen = "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"
-    payload = {"fen": fools_mate_fen}
-    response = client.post("/move", json=payload, headers=valid_headers)
-    assert response.status_code == 400
-    assert response.json()["detail"] == "Game is over"
+    __slots__ = ("move", "reasoning")
 
+    def __init__(self, move_val, reasoning=""):
+        self.move = _MoveVal(move_val)
+        self.reasoning = reasoning
 
-def test_move_no_api_key(client):
-    """Test requesting a move without API key header."""
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen}
-    response = client.post("/move", json=payload)
-    assert response.status_code == 412
-    assert "OpenAI API key is missing" in response.json()["detail"]
 
+class _StubFactory:
+    """Client factory stub returning `client` and recording each call's kwargs."""
 
-@patch("src.api.endpoints.get_langchain_client")
-@pytest.mark.asyncio
-async def test_move_valid_fen(mock_get_langchain, client, valid_headers):
-    """Test a valid move request with mocked LangChain response."""
-    mock_llm = MagicMock()
-    mock_structured_llm = MagicMock()
-    mock_get_langchain.return_value = mock_llm
-    mock_llm.with_structured_output.return_value = mock_structured_llm
+    __slots__ = ("client", "calls")
 
-    class MoveSelectionMock:
-        def __init__(self, move_val, reasoning):
-            class MoveVal:
-                def __init__(self, v):
-                    self.value = v
+    def __init__(self, client=None):
+        self.client = client
+        self.calls = []
 
-            self.move = MoveVal(move_val)
-            self.reasoning = reasoning
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.client
 
-    mock_response = MoveSelectionMock("e2e4", "Best opening move.")
-    mock_structured_llm.ainvoke = AsyncMock(return_value=mock_response)
 
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen}
+def _completion(parsed):
+    message = SimpleNamespace(parsed=parsed)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
 
-    response = client.post("/move", json=payload, headers=valid_headers)
 
-    assert response.status_code == 200, response.text
-    data = response.json()
-    assert data["move"] == "e2e4"
-    assert data["san"] == "e4"
+class _StubCompletions:
+    """`chat.completions` whose `parse` returns `response` or raises `exc`, and
+    whose `stream` returns `stream_response`. A set `gate` holds every `parse`
+    call until the event is set."""
 
-    # Verify key was passed to client factory
-    mock_get_langchain.assert_called_once_with(
-        api_key="sk-test-key-for-moves", model="gpt-4o-mini"
+    __slots__ = (
+        "response",
+        "exc",
+        "calls",
+        "gate",
+        "stream_response",
+        "stream_calls",
     )
 
+    def __init__(self, response=None, exc=None):
+        self.response = response
+        self.exc = exc
+        self.calls = []
+        self.gate: asyncio.Event | None = None
+        self.stream_response = None
+        self.stream_calls = []
 
-@patch("src.api.endpoints.get_langchain_client")
-@pytest.mark.asyncio
-async def test_move_rate_limit_error(mock_get_langchain, client, valid_headers):
-    """Test handling of OpenAI RateLimitError."""
-    from openai import RateLimitError
-
-    mock_llm = MagicMock()
-    mock_structured_llm = MagicMock()
-    mock_get_langchain.return_value = mock_llm
-    mock_llm.with_structured_output.return_value = mock_structured_llm
+    async def parse(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.gate:
+            _ = await self.gate.wait()
+        if self.exc:
+            raise self.exc
+        return _completion(self.response)
 
-    err = RateLimitError(message="Rate limit exceeded", response=MagicMock(), body=None)
-    mock_structured_llm.ainvoke = AsyncMock(side_effect=err)
+    def stream(self, **kwargs):
+        self.stream_calls.append(kwargs)
+        return self.stream_response
 
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen}
-    response = client.post("/move", json=payload, headers=valid_headers)
 
-    assert response.status_code == 429
-    assert "OpenAI API quota exceeded" in response.json()["detail"]
+class _StubModels:
+    """`models.list` returning `response` or raising `exc`."""
 
+    __slots__ = ("response", "exc", "calls")
 
-@patch("src.api.endpoints.get_langchain_client")
-@pytest.mark.asyncio
-async def test_move_auth_error(mock_get_langchain, client, valid_headers):
-    """Test handling of OpenAI AuthenticationError."""
-    from openai import AuthenticationError
+    def __init__(self):
+        self.response = None
+        self.exc = None
+        self.calls = 0
 
-    mock_llm = MagicMock()
-    mock_structured_llm = MagicMock()
-    mock_get_langchain.return_value = mock_llm
-    mock_llm.with_structured_output.return_value = mock_structured_llm
+    async def list(self):
+        self.calls += 1
+        # Yield like a real request would, so concurrent callers can overlap
+        await asyncio.sleep(0)
+        if self.exc:
+            raise self.exc
+        return self.response
 
-    err = AuthenticationError(message="Invalid key", response=MagicMock(), body=None)
-    mock_structured_llm.ainvoke = AsyncMock(side_effect=err)
 
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen}
-    response = client.post("/move", json=payload, headers=valid_headers)
+class _StubOpenAI:
+    """Just the `chat.completions` and `models` surface of `AsyncOpenAI`."""
 
-    assert response.status_code == 401
-    assert "OpenAI API key is invalid" in response.json()["detail"]
+    __slots__ = ("completions", "models")
 
+    def __init__(self, response=None, exc=None):
+        self.completions = _StubCompletions(response, exc)
+        self.models = _StubModels()
 
-@patch("src.api.endpoints.get_langchain_client")
-@pytest.mark.asyncio
-async def test_move_connection_error(mock_get_langchain, client, valid_headers):
-    """Test handling of OpenAI APIConnectionError."""
-    from openai import APIConnectionError
+    @property
+    def chat(self):
+        return self
 
-    mock_llm = MagicMock()
-    mock_structured_llm = MagicMock()
-    mock_get_langchain.return_value = mock_llm
-    mock_llm.with_structured_output.return_value = mock_structured_llm
 
-    err = APIConnectionError(request=MagicMock())
-    mock_structured_llm.ainvoke = AsyncMock(side_effect=err)
+class _StubLLM:
+    """LangChain model whose structured binding returns `response`."""
 
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen}
-    response = client.post("/move", json=payload, headers=valid_headers)
+    __slots__ = ("response",)
 
-    assert response.status_code == 503
-    assert "Failed to connect to OpenAI API" in response.json()["detail"]
+    def __init__(self, response=None):
+        self.response = response
 
+    def with_structured_output(self, schema):
+        return self
 
-@patch("src.api.endpoints.get_langchain_client")
-@pytest.mark.asyncio
-async def test_move_with_custom_model(mock_get_langchain, client, valid_headers):
-    """Test that custom model parameter is passed to LangChain client."""
-    mock_llm = MagicMock()
-    mock_structured_llm = MagicMock()
-    mock_get_langchain.return_value = mock_llm
-    mock_llm.with_structured_output.return_value = mock_structured_llm
+    async def ainvoke(self, messages):
+        return self.response
 
-    class MoveSelectionMock:
-        def __init__(self, move_val, reasoning):
-            class MoveVal:
-                def __init__(self, v):
-                    self.value = v
 
-            self.move = MoveVal(move_val)
-            self.reasoning = reasoning
+class _MockedOpenAI:
+    """Stub clients and factories installed for each test by `mocked_openai`."""
 
-    mock_response = MoveSelectionMock("e2e4", "Best opening move.")
-    mock_structured_llm.ainvoke = AsyncMock(return_value=mock_response)
+    __slots__ = ("client", "llm", "get_openai_client", "get_langchain_client")
 
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen, "model": "gpt-4o"}
-    response = client.post("/move", json=payload, headers=valid_headers)
-
-    assert response.status_code == 200
-    mock_get_langchain.assert_called_once_with(
-        api_key="sk-test-key-for-moves", model="gpt-4o"
-    )
+    def __init__(self):
+        self.client = _StubOpenAI()
+        self.llm = _StubLLM()
+        self.get_openai_client = _StubFactory(self.client)
+        self.get_langchain_client = _StubFactory(self.llm)
 
 
-@patch("src.api.endpoints.get_langchain_client")
-@pytest.mark.asyncio
-async def test_move_dict_response(mock_get_langchain, client, valid_headers):
-    """Test handling of dict response from LangChain."""
-    mock_llm = MagicMock()
-    mock_structured_llm = MagicMock()
-    mock_get_langchain.return_value = mock_llm
-    mock_llm.with_structured_output.return_value = mock_structured_llm
+@pytest.fixture(autouse=True)
+def mocked_openai(monkeypatch):
+    # No test reaches OpenAI; tests set replies on the stubs or patch over them
+    mocked = _MockedOpenAI()
+    monkeypatch.setattr(endpoints, "get_openai_client", mocked.get_openai_client)
+    # Structured bindings are built in config, which looks up its own factory
+    monkeypatch.setattr(config, "get_langchain_client", mocked.get_langchain_client)
+    return mocked
 
-    mock_response = {"move": "d2d4", "reasoning": "Queen's pawn opening."}
-    mock_structured_llm.ainvoke = AsyncMock(return_value=mock_response)
 
-    start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    payload = {"fen": start_fen}
-    response = client.post("/move", json=payload, headers=valid_headers)
+@pytest.fixture(scope="module")
+def valid_headers():
+    return {"X-OpenAI-Key": "sk-test-key-for-moves"}
 
-    assert response.status_code == 200
-    data = response.json()
-    assert data["move"] == "d2d4"
 
+class FakeMoveStream:
+    """Async context manager mimicking `client.chat.completions.stream(...)`."""
 
-def test_move_stalemate(client, valid_headers):
-    """Test requesting a move in a stalemate position."""
-    stalemate_fen = "k7/8/1K6/8/8/8/8/8 b - - 0 1"
-    payload = {"fen": stalemate_fen}
-    response = client.post("/move", json=payload, headers=valid_headers)
-    assert response.status_code == 400
-    assert response.json()["detail"] == "Game is over"
+    __slots__ = ("tokens", "parsed", "error")
 
+    def __init__(self, tokens, parsed=None, error=None):
+        self.tokens = tokens
+        self.parsed = parsed
+        self.error = error
 
-# --- Config Models Endpoint Tests ---
+    async def __aenter__(self):
+        if self.error:
+            raise self.error
+        return self
 
+    async def __aexit__(self, *exc_info):
+        return False
 
-def test_get_models_no_api_key(client):
-    """Test getting models when no API key header is present."""
-    response = client.get("/config/models")
-    assert response.status_code == 200
-    assert response.json() == []
+    def __aiter__(self):
+        return self._events()
 
+    async def _events(self):
+        for token in self.tokens:
+            yield SimpleNamespace(type="content.delta", delta=token)
 
-@patch("src.api.endpoints.AsyncOpenAI")
-@pytest.mark.asyncio
-async def test_get_models_success(mock_async_openai, client, valid_headers):
-    """Test getting models returns filtered list of chat models."""
-    mock_client_instance = AsyncMock()
-    mock_async_openai.return_value = mock_client_instance
+    async def get_final_completion(self):
+        return _completion(self.parsed)
 
-    class MockModel:
-        def __init__(self, model_id):
-            self.id = model_id
 
-    mock_models_response = MagicMock()
-    mock_models_response.data = [
-        MockModel("gpt-4o"),
-        MockModel("gpt-4o-mini"),
-        MockModel("gpt-3.5-turbo"),
-        MockModel("gpt-4-vision-preview"),
+def _sse_events(response):
+    return [
+        orjson.loads(line.removeprefix("data: "))
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
     ]
-    mock_client_instance.models.list.return_value = mock_models_response
-
-    response = client.get("/config/models", headers=valid_headers)
-
-    assert response.status_code == 200
-    models = response.json()
-    assert "gpt-4o" in models
-    assert "gpt-4o-mini" in models
-    assert "gpt-3.5-turbo" in models
-    assert "gpt-4-vision-preview" not in models
 
 
-@patch("src.api.endpoints.AsyncOpenAI")
-@pytest.mark.asyncio
-async def test_get_models_api_error(mock_async_openai, client, valid_headers):
-    """Test getting models returns fallback list when API fails."""
-    mock_client_instance = AsyncMock()
-    mock_async_openai.return_value = mock_client_instance
-    mock_client_instance.models.list.side_effect = Exception("API Error")
-
-    response = client.get("/config/models", headers=valid_headers)
-
-    assert response.status_code == 200
-    fallback_models = response.json()
-    assert "gpt-4o-mini" in fallback_models
+class TestHealth:
+    """Tests for `/health`."""
+
+    def test_health_check(self, client):
+        """Test the health check endpoint returns 200 and correct status."""
+        response = client.get("/health")
+        assert response.status_code == 200
+        data = _json(response)
+        expected_keys = {"status", "openai_api_key_configured"}
+        assert expected_keys.issubset(data.keys())
+        assert data["status"] == "ok"
+        # Without header, it should report not configured
+        assert data["openai_api_key_configured"] is False
+
+    def test_health_check_with_header(self, client):
+        """Test health check reports configured when header is present."""
+        response = client.get("/health", headers={"X-OpenAI-Key": "sk-test"})
+        assert _json(response)["openai_api_key_configured"] is True
+
+
+class TestConfig:
+    """Tests for `/config/api-key`."""
+
+    async def test_validate_api_key_success(self, mocked_openai):
+        """Test validating a valid API key via header."""
+        mocked_openai.client.models.response = SimpleNamespace(data=[])
+
+        # Only the return value matters here, so skip the HTTP stack
+        result = await set_api_key(x_openai_key="sk-test-valid-key")
+
+        assert result == {"status": "success", "message": "API key validated"}
+        assert mocked_openai.get_openai_client.calls == [
+            {"api_key": "sk-test-valid-key"}
+        ]
+
+    async def test_validate_api_key_invalid(self, mocked_openai):
+        """Test validating an invalid API key."""
+        mocked_openai.client.models.exc = Exception("Invalid key")
+
+        with pytest.raises(HTTPException) as exc_info:
+            _ = await set_api_key(x_openai_key="sk-test-invalid-key")
+
+        assert exc_info.value.status_code == 401
+        assert "Invalid OpenAI API key" in exc_info.value.detail
+
+    def test_validate_api_key_missing_header(self, client):
+        """Test validation fails if header is missing."""
+        response = client.post("/config/api-key", json={})
+        assert response.status_code == 400
+        assert "Missing X-OpenAI-Key header" in _json(response)["detail"]
+
+
+class TestMove:
+    """Tests for `/move`."""
+
+    async def test_move_invalid_fen(self, aclient, valid_headers):
+        """Test requesting a move with an invalid FEN string."""
+        payload = {"fen": "invalid-fen-string"}
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+        assert response.status_code == 400
+        assert _json(response)["detail"] == "Invalid FEN string"
+
+    async def test_move_game_over(self, aclient, valid_headers):
+        """Test requesting a move when the game is already over (Checkmate)."""
+        payload = {"fen": FOOLS_MATE_FEN}
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+        assert response.status_code == 400
+        assert _json(response)["detail"] == "Game is over"
+
+    async def test_move_no_api_key(self, aclient):
+        """Test requesting a move without API key header."""
+        payload = START_PAYLOAD
+        response = await aclient.post("/move", json=payload)
+        assert response.status_code == 412
+        assert "OpenAI API key is missing" in _json(response)["detail"]
+
+    @pytest.mark.parametrize(("fen", "model", "move", "san"), MOVE_OK_CASES)
+    async def test_move_valid_fen(
+        self, aclient, valid_headers, mocked_openai, fen, model, move, san
+    ):
+        """Test a valid move request with mocked OpenAI response."""
+        completions = mocked_openai.client.completions
+        completions.response = MoveSelectionMock(move, "Best move.")
+        payload = {"fen": fen} if model is None else {"fen": fen, "model": model}
+
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+
+        assert response.status_code == 200, response.text
+        data = _json(response)
+        assert data["move"] == move
+        assert data["san"] == san
+
+        # Verify key was passed to client factory and the model to the OpenAI call
+        assert mocked_openai.get_openai_client.calls == [
+            {"api_key": "sk-test-key-for-moves"}
+        ]
+        assert completions.calls[0]["model"] == (model or "gpt-4o-mini")
+
+    @pytest.mark.parametrize(
+        ("err", "status", "detail"), ERR_CASES, ids=["rate_limit", "auth", "connection"]
+    )
+    async def test_move_openai_errors(
+        self, aclient, valid_headers, mocked_openai, err, status, detail
+    ):
+        """Test OpenAI errors are mapped to the matching HTTP status."""
+        mocked_openai.client.completions.exc = err
+        payload = START_PAYLOAD
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+
+        assert response.status_code == status
+        assert detail in _json(response)["detail"]
+
+    async def test_move_illegal_llm_move(self, aclient, valid_headers, mocked_openai):
+        """Test a move outside the legal set is reported explicitly."""
+        mocked_openai.client.completions.response = MoveSelectionMock("e2e5")
+        response = await aclient.post(
+            "/move", json=START_PAYLOAD, headers=valid_headers
+        )
+
+        assert response.status_code == 500
+        assert _json(response)["detail"] == "LLM produced illegal move"
+
+    async def test_move_cache(self, aclient, valid_headers, mocked_openai):
+        """Test repeat positions are served from the move cache unless disabled."""
+        completions = mocked_openai.client.completions
+        completions.response = MoveSelectionMock("e2e4")
+        calls = completions.calls
+        first = await aclient.post("/move", json=START_PAYLOAD, headers=valid_headers)
+        second = await aclient.post("/move", json=START_PAYLOAD, headers=valid_headers)
+        assert _json(first) == _json(second) == {"move": "e2e4", "san": "e4"}
+        assert len(calls) == 1
+
+        payload = {**START_PAYLOAD, "use_cache": False}
+        _ = await aclient.post("/move", json=payload, headers=valid_headers)
+        assert len(calls) == 2
+
+        assert _json(await aclient.post("/config/cache/clear"))["status"] == "success"
+        _ = await aclient.post("/move", json=START_PAYLOAD, headers=valid_headers)
+        assert len(calls) == 3
+
+    async def test_move_cache_is_per_api_key(
+        self, aclient, valid_headers, mocked_openai
+    ):
+        """Test a cached move is not served to a request with a different key."""
+        completions = mocked_openai.client.completions
+        completions.response = MoveSelectionMock("e2e4")
+        _ = await aclient.post("/move", json=START_PAYLOAD, headers=valid_headers)
+
+        completions.exc = AUTH_ERROR
+        response = await aclient.post(
+            "/move", json=START_PAYLOAD, headers={"X-OpenAI-Key": "sk-bogus"}
+        )
+
+        assert response.status_code == 401
+        assert len(completions.calls) == 2
+
+    async def test_move_batched_refusal(self, aclient, valid_headers, mocked_openai):
+        """Test a refused batched call fails each request like a lone refusal."""
+        completions = mocked_openai.client.completions
+        completions.gate = asyncio.Event()
+        payload = {**START_PAYLOAD, "use_cache": False}
+
+        async def wait_for_calls(count):
+            while len(completions.calls) < count:
+                await asyncio.sleep(0.001)
+
+        def post():
+            return asyncio.create_task(
+                aclient.post("/move", json=payload, headers=valid_headers)
+            )
+
+        # The first call holds the batcher busy, so the next two share one call
+        first = post()
+        await asyncio.wait_for(wait_for_calls(1), timeout=5)
+        batched = [post(), post()]
+        await asyncio.wait_for(wait_for_calls(2), timeout=5)
+        completions.gate.set()
+        responses = await asyncio.gather(first, *batched)
+
+        assert len(completions.calls) == 2
+        for response in responses:
+            assert response.status_code == 500
+            assert _json(response)["detail"] == "Failed to parse LLM response"
+
+    async def test_move_from_both_clients(
+        self, client, aclient, valid_headers, mocked_openai
+    ):
+        """Test /move is served from TestClient's loop and the test loop alike."""
+        mocked_openai.client.completions.response = MoveSelectionMock("e2e4")
+        payload = {**START_PAYLOAD, "use_cache": False}
+
+        sync_response = client.post("/move", json=payload, headers=valid_headers)
+        async_response = await asyncio.wait_for(
+            aclient.post("/move", json=payload, headers=valid_headers), timeout=5
+        )
+
+        assert (
+            _json(sync_response)
+            == _json(async_response)
+            == {
+                "move": "e2e4",
+                "san": "e4",
+            }
+        )
+
+    async def test_move_langchain_path(
+        self, aclient, valid_headers, monkeypatch, mocked_openai
+    ):
+        """Test moves go through LangChain when the feature flag is enabled."""
+        monkeypatch.setattr(endpoints, "USE_LANGCHAIN", True)
+        mocked_openai.llm.response = MoveSelectionMock("d2d4", "Queen's pawn opening.")
+        payload = START_PAYLOAD
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+
+        assert response.status_code == 200
+        data = _json(response)
+        assert data["move"] == "d2d4"
+        assert mocked_openai.get_langchain_client.calls == [
+            {"api_key": "sk-test-key-for-moves", "model": "gpt-4o-mini"}
+        ]
+        assert mocked_openai.client.completions.calls == []
+
+    async def test_move_insufficient_material(self, aclient, valid_headers):
+        """Test requesting a move when only the kings are left on the board."""
+        payload = {"fen": BARE_KINGS_FEN}
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+        assert response.status_code == 400
+        assert _json(response)["detail"] == "Game is over"
+
+    async def test_move_single_legal_move(self, aclient, valid_headers, mocked_openai):
+        """Test a position with one legal move is answered without calling the LLM."""
+        response = await aclient.post(
+            "/move", json=FORCED_MOVE_PAYLOAD, headers=valid_headers
+        )
+
+        assert response.status_code == 200
+        assert _json(response) == {"move": "a1b2", "san": "Kxb2"}
+        assert mocked_openai.get_openai_client.calls == []
+        assert mocked_openai.get_langchain_client.calls == []
+
+    def test_move_selection_model_is_cached(self):
+        """Test the structured output model is built once per legal-move set."""
+        moves = frozenset({"e2e4", "d2d4"})
+        model = _move_selection_model(moves)
+        assert _move_selection_model(frozenset({"d2d4", "e2e4"})) is model
+        selection = model.model_validate({"reasoning": "Center.", "move": "d2d4"})
+        assert selection.move.value == "d2d4"
+
+    def test_validate_position_copies_cached_board(self):
+        """Test each request gets its own board copy of the cached parse."""
+        board, _ = _validate_position(START_FEN)
+        _ = board.push_uci("e2e4")
+        fresh, legal_moves = _validate_position(START_FEN)
+        assert fresh.fen() == START_FEN
+        assert "e2e4" in legal_moves
+
+    async def test_move_stalemate(self, aclient, valid_headers):
+        """Test requesting a move in a stalemate position."""
+        payload = {"fen": STALEMATE_FEN}
+        response = await aclient.post("/move", json=payload, headers=valid_headers)
+        assert response.status_code == 400
+        assert _json(response)["detail"] == "Game is over"
+
+
+class TestModels:
+    """Tests for `/config/models`."""
+
+    def test_get_models_no_api_key(self, client):
+        """Test getting models when no API key header is present."""
+        response = client.get("/config/models")
+        assert response.status_code == 200
+        assert _json(response) == []
+
+    def test_get_models_success(self, client, valid_headers, mocked_openai):
+        """Test getting models returns filtered list of chat models."""
+        mocked_openai.client.models.response = _MODELS_RESPONSE
+
+        response = client.get("/config/models", headers=valid_headers)
+
+        assert response.status_code == 200
+        assert _json(response) == [
+            "gpt-3.5-turbo",
+            "gpt-4o",
+            "gpt-4o-mini",
+            "o1-preview",
+        ]
+
+    def test_get_models_api_error(self, client, valid_headers, mocked_openai):
+        """Test getting models returns fallback list when API fails."""
+        mocked_openai.client.models.exc = Exception("API Error")
+
+        response = client.get("/config/models", headers=valid_headers)
+
+        assert response.status_code == 200
+        fallback_models = _json(response)
+        assert "gpt-4o-mini" in fallback_models
+
+    def test_get_models_cached(self, client, valid_headers, mocked_openai):
+        """Test repeated model list requests are served from the cache."""
+        models = mocked_openai.client.models
+        models.response = SimpleNamespace(data=[SimpleNamespace(id="gpt-4o")])
+
+        first = client.get("/config/models", headers=valid_headers)
+        second = client.get("/config/models", headers=valid_headers)
+
+        assert _json(first) == _json(second) == ["gpt-4o"]
+        assert models.calls == 1
+
+    async def test_get_models_single_flight(self, mocked_openai):
+        """Test concurrent requests for one key share a single upstream call."""
+        models = mocked_openai.client.models
+        models.response = SimpleNamespace(data=[SimpleNamespace(id="gpt-4o")])
+
+        results = await asyncio.gather(
+            get_models(x_openai_key="sk-test-key-for-moves"),
+            get_models(x_openai_key="sk-test-key-for-moves"),
+        )
+
+        assert results == [["gpt-4o"], ["gpt-4o"]]
+        assert models.calls == 1
+
+    async def test_get_models_cache_is_bounded(self, mocked_openai):
+        """Test the models cache and its locks do not grow with every key seen."""
+        mocked_openai.client.models.response = SimpleNamespace(data=[])
+
+        for i in range(endpoints.MODELS_CACHE_MAX_KEYS + 1):
+            _ = await get_models(x_openai_key=f"sk-{i}")
+
+        assert len(endpoints._models_cache) == endpoints.MODELS_CACHE_MAX_KEYS
+        assert len(endpoints._models_locks) == endpoints.MODELS_CACHE_MAX_KEYS
+        assert "sk-0" not in endpoints._models_cache
+
+    def test_get_models_stale_on_error(self, client, valid_headers, mocked_openai):
+        """Test an expired cache entry is served when refreshing it fails."""
+        expired = time.monotonic() - endpoints.MODELS_CACHE_TTL - 1
+        endpoints._models_cache["sk-test-key-for-moves"] = (expired, ["gpt-4o"])
+        mocked_openai.client.models.exc = Exception("API Error")
+
+        response = client.get("/config/models", headers=valid_headers)
+
+        assert response.status_code == 200
+        assert _json(response) == ["gpt-4o"]
+
+
+class TestMoveStream:
+    """Tests for `/move/stream`."""
+
+    def test_move_stream_valid_fen(self, client, valid_headers, mocked_openai):
+        """Test streaming yields reasoning tokens followed by the validated move."""
+        tokens = ['{"reasoning":"Control', ' the center."', ',"move":"e2e4"}']
+        mocked_openai.client.completions.stream_response = FakeMoveStream(
+            tokens, parsed={"reasoning": "Control the center.", "move": "e2e4"}
+        )
+
+        response = client.post(
+            "/move/stream", json=START_PAYLOAD, headers=valid_headers
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _sse_events(response)
+        assert [e["token"] for e in events[:-1]] == tokens
+        assert events[-1] == {"done": True, "move": "e2e4", "san": "e4"}
+        assert mocked_openai.get_openai_client.calls == [
+            {"api_key": "sk-test-key-for-moves"}
+        ]
+
+    def test_move_stream_openai_error(self, client, valid_headers, mocked_openai):
+        """Test OpenAI errors raised mid-stream are reported as a final error event."""
+        mocked_openai.client.completions.stream_response = FakeMoveStream(
+            [], error=RATE_LIMIT_ERROR
+        )
+
+        response = client.post(
+            "/move/stream", json=START_PAYLOAD, headers=valid_headers
+        )
+
+        assert response.status_code == 200
+        events = _sse_events(response)
+        assert events[-1]["status"] == 429
+        assert "OpenAI API quota exceeded" in events[-1]["error"]
+
+    def test_move_stream_single_legal_move(self, client, valid_headers, mocked_openai):
+        """Test streaming a forced move sends only the final event."""
+        response = client.post(
+            "/move/stream", json=FORCED_MOVE_PAYLOAD, headers=valid_headers
+        )
+
+        assert _sse_events(response) == [{"done": True, "move": "a1b2", "san": "Kxb2"}]
+        assert mocked_openai.client.completions.stream_calls == []
+
+    def test_move_stream_invalid_fen(self, client, valid_headers):
+        """Test position validation fails before the stream is opened."""
+        payload = {"fen": "invalid-fen-string"}
+        response = client.post("/move/stream", json=payload, headers=valid_headers)
+        assert response.status_code == 400
+        assert _json(response)["detail"] == "Invalid FEN string"
+
+    def test_move_stream_no_api_key(self, client):
+        """Test streaming a move without API key header."""
+        response = client.post("/move/stream", json=START_PAYLOAD)
+        assert response.status_code == 412
+        assert "OpenAI API key is missing" in _json(response)["detail"]
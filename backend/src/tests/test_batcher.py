@@ -0,0 +1,222 @@
+import asyncio
+import threading
+
+import pytest
+from src.api.endpoints import _move_selection_model
+from src.core.batcher import MoveBatcher
+
+E4_MOVES = frozenset({"e2e4", "d2d4"})
+E5_MOVES = frozenset({"e7e5", "c7c5"})
+E4_SCHEMA = _move_selection_model(E4_MOVES)
+E5_SCHEMA = _move_selection_model(E5_MOVES)
+
+
+class RecordingInvoke:
+    """Answers every position with the first legal move of its schema."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, schema, messages):
+        self.calls.append((schema, messages))
+        fields = schema.model_fields
+        if "move" in fields:
+            return schema.model_validate(
+                {
+                    "reasoning": "Only one.",
+                    "move": next(iter(fields["move"].annotation)),
+                }
+            )
+        return schema.model_validate(
+            {
+                name: {
+                    "reasoning": "Batched.",
+                    "move": next(
+                        iter(field.annotation.model_fields["move"].annotation)
+                    ),
+                }
+                for name, field in fields.items()
+            }
+        )
+
+
+async def _submit_all(batcher, requests):
+    try:
+        return await asyncio.gather(*(batcher.submit(*r) for r in requests))
+    finally:
+        await batcher.stop()
+
+
+async def test_single_request_is_not_batched():
+    """Test a lone request is sent with its own schema and prompt."""
+    invoke = RecordingInvoke()
+    results = await _submit_all(
+        MoveBatcher(), [("key", "fen-a", E4_MOVES, E4_SCHEMA, invoke)]
+    )
+
+    assert len(invoke.calls) == 1
+    schema, messages = invoke.calls[0]
+    assert schema is E4_SCHEMA
+    assert messages[-1]["content"].startswith("FEN: fen-a\nLegal UCI moves: d2d4,e2e4")
+    assert results[0].move.value in {"e2e4", "d2d4"}
+
+
+async def test_single_request_does_not_wait():
+    """Test a request reaching an idle batcher skips the batching window."""
+    invoke = RecordingInvoke()
+    request = ("key", "fen-a", E4_MOVES, E4_SCHEMA, invoke)
+
+    results = await asyncio.wait_for(
+        _submit_all(MoveBatcher(wait_ms=60_000), [request]), timeout=5
+    )
+
+    assert len(results) == 1
+
+
+async def test_concurrent_requests_share_one_call():
+    """Test concurrent requests with the same key are answered by one LLM call."""
+    invoke = RecordingInvoke()
+    results = await _submit_all(
+        MoveBatcher(),
+        [
+            ("key", "fen-a", E4_MOVES, E4_SCHEMA, invoke),
+            ("key", "fen-b", E5_MOVES, E5_SCHEMA, invoke),
+        ],
+    )
+
+    assert len(invoke.calls) == 1
+    schema, messages = invoke.calls[0]
+    assert set(schema.model_fields) == {"p0", "p1"}
+    assert "p0:\nFEN: fen-a\nLegal UCI moves: d2d4,e2e4" in messages[-1]["content"]
+    assert "p1:\nFEN: fen-b\nLegal UCI moves: c7c5,e7e5" in messages[-1]["content"]
+    assert results[0].move.value in {"e2e4", "d2d4"}
+    assert results[1].move.value in {"e7e5", "c7c5"}
+
+
+async def test_requests_behind_an_in_flight_call_are_batched():
+    """Test requests arriving while a call is in flight are batched together."""
+    invoke = RecordingInvoke()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_invoke(schema, messages):
+        started.set()
+        _ = await release.wait()
+        return await invoke(schema, messages)
+
+    batcher = MoveBatcher()
+    try:
+        first = asyncio.create_task(
+            batcher.submit("key", "fen-a", E4_MOVES, E4_SCHEMA, slow_invoke)
+        )
+        _ = await started.wait()
+        rest = asyncio.gather(
+            batcher.submit("key", "fen-b", E5_MOVES, E5_SCHEMA, invoke),
+            batcher.submit("key", "fen-c", E4_MOVES, E4_SCHEMA, invoke),
+        )
+        assert len(await rest) == 2
+        release.set()
+        _ = await first
+    finally:
+        await batcher.stop()
+
+    assert [set(schema.model_fields) for schema, _ in invoke.calls] == [
+        {"p0", "p1"},
+        {"reasoning", "move"},
+    ]
+
+
+async def test_stop_cancels_requests_waiting_for_a_batch():
+    """Test stopping the batcher cancels requests held in the batching window."""
+    release = asyncio.Event()
+
+    async def blocked_invoke(schema, messages):
+        _ = await release.wait()
+
+    batcher = MoveBatcher(wait_ms=60_000)
+    first = asyncio.create_task(
+        batcher.submit("key", "fen-a", E4_MOVES, E4_SCHEMA, blocked_invoke)
+    )
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(
+        batcher.submit("key", "fen-b", E5_MOVES, E5_SCHEMA, blocked_invoke)
+    )
+    await asyncio.sleep(0.01)
+
+    await batcher.stop()
+
+    for task in (first, second):
+        with pytest.raises(asyncio.CancelledError):
+            _ = await asyncio.wait_for(task, timeout=5)
+
+
+async def test_requests_from_another_loop_get_their_own_worker():
+    """Test a second event loop is served while the first one is still running."""
+    batcher = MoveBatcher()
+    request = ("key", "fen-a", E4_MOVES, E4_SCHEMA, RecordingInvoke())
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+    try:
+        # The worker is first bound to a loop that stays alive, like TestClient's
+        _ = asyncio.run_coroutine_threadsafe(
+            batcher.submit(*request), other_loop
+        ).result(timeout=5)
+
+        results = await asyncio.wait_for(_submit_all(batcher, [request]), timeout=5)
+
+        assert len(results) == 1
+    finally:
+        _ = asyncio.run_coroutine_threadsafe(batcher.stop(), other_loop).result(
+            timeout=5
+        )
+        _ = other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+
+
+async def test_requests_with_different_keys_are_not_mixed():
+    """Test requests for different API keys or models get separate calls."""
+    invoke = RecordingInvoke()
+    _ = await _submit_all(
+        MoveBatcher(),
+        [
+            (("key-1", "gpt-4o"), "fen-a", E4_MOVES, E4_SCHEMA, invoke),
+            (("key-2", "gpt-4o"), "fen-b", E5_MOVES, E5_SCHEMA, invoke),
+        ],
+    )
+
+    assert [schema for schema, _ in invoke.calls] == [E4_SCHEMA, E5_SCHEMA]
+
+
+async def test_batch_error_is_raised_for_every_request():
+    """Test an error from the shared call is propagated to each waiting request."""
+
+    async def failing_invoke(schema, messages):
+        raise RuntimeError("LLM down")
+
+    with pytest.raises(RuntimeError, match="LLM down"):
+        _ = await _submit_all(
+            MoveBatcher(),
+            [
+                ("key", "fen-a", E4_MOVES, E4_SCHEMA, failing_invoke),
+                ("key", "fen-b", E5_MOVES, E5_SCHEMA, failing_invoke),
+            ],
+        )
+
+
+async def test_batch_refusal_resolves_every_request_to_none():
+    """Test a batched call with no parsed output leaves each request unparsed."""
+
+    async def refusing_invoke(schema, messages):
+        return None
+
+    results = await _submit_all(
+        MoveBatcher(),
+        [
+            ("key", "fen-a", E4_MOVES, E4_SCHEMA, refusing_invoke),
+            ("key", "fen-b", E5_MOVES, E5_SCHEMA, refusing_invoke),
+        ],
+    )
+
+    assert results == [None, None]
@@ -0,0 +1,43 @@
+import asyncio
+
+from src.core.config import (
+    close_http_client,
+    get_http_client,
+    get_langchain_client,
+    get_openai_client,
+    get_structured_llm,
+)
+from src.models.schemas import MoveSelectionBase
+
+
+def test_openai_client_is_cached_per_key():
+    """Test the same key reuses one client and its shared connection pool."""
+    client = get_openai_client(api_key="sk-test-cache")
+    assert get_openai_client(api_key="sk-test-cache") is client
+    assert get_openai_client(api_key="sk-test-other") is not client
+    assert client._client is get_http_client()
+
+
+def test_langchain_client_is_cached_per_key_and_model():
+    """Test LangChain clients are cached by (api_key, model)."""
+    llm = get_langchain_client(api_key="sk-test-cache", model="gpt-4o-mini")
+    assert get_langchain_client(api_key="sk-test-cache", model="gpt-4o-mini") is llm
+    assert get_langchain_client(api_key="sk-test-cache", model="gpt-4o") is not llm
+
+
+def test_close_http_client_resets_caches():
+    """Test closing the pool drops cached clients so new ones get a fresh pool."""
+    http_client = get_http_client()
+    client = get_openai_client(api_key="sk-test-cache")
+    binding = get_structured_llm("sk-test-cache", "gpt-4o-mini", MoveSelectionBase)
+
+    asyncio.run(close_http_client())
+
+    assert http_client.is_closed
+    assert get_http_client() is not http_client
+    assert get_openai_client(api_key="sk-test-cache") is not client
+    # Bindings hold a LangChain client, so they must not outlive the pool either
+    assert (
+        get_structured_llm("sk-test-cache", "gpt-4o-mini", MoveSelectionBase)
+        is not binding
+    )